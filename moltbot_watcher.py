@@ -4,19 +4,71 @@ Moltbot Watcher - Monitor Moltbot conversations and send alerts via Telegram
 """
 
 import asyncio
+import collections
+import json
 import logging
 import os
+import re
 import subprocess
 import sys
-from datetime import datetime
+import time
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
 import yaml
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
-from watchdog.events import FileSystemEventHandler
+from telegram.ext import Application, CommandHandler, ContextTypes, filters
+from watchdog.events import (
+    DirCreatedEvent,
+    DirDeletedEvent,
+    DirMovedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileMovedEvent,
+    FileSystemEventHandler,
+    PatternMatchingEventHandler,
+)
 from watchdog.observers import Observer
+from watchdog.utils.patterns import match_any_paths
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import regex
+except ImportError:
+    regex = None
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+try:
+    from pystemd.systemd1 import Unit
+except ImportError:
+    Unit = None
+
+try:
+    from systemd import journal
+except ImportError:
+    journal = None
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +77,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Timestamp format used in messages
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Telegram rejects messages longer than 4096 characters
+MAX_ALERT_LENGTH = 4000
+
+# Alerts queued within this window are sent together
+ALERT_BATCH_SECONDS = 0.25
+
+# Modify events for the same file within this window are handled once
+DEBOUNCE_SECONDS = 0.05
+
+# Upper bound on remembered senders; the least recently seen are forgotten
+MAX_KNOWN_SENDERS = 10000
+
+# Time budget for one suspicious pattern scan (needs the regex package)
+PATTERN_TIMEOUT_SECONDS = 0.05
+
+# A quantified group that itself contains a quantifier, e.g. (a+)+ or (.*)*
+NESTED_QUANTIFIER = re.compile(r"\([^()]*[+*][^()]*\)[+*{]")
+
+# How long a `systemctl is-active` result is reused by /status
+STATUS_CACHE_SECONDS = 1.0
+
+# New files larger than this are treated as copied or rotated transcripts
+# and followed from EOF instead of being replayed from the start
+NEW_FILE_REPLAY_BYTES = 64 * 1024
+
+# Session files kept open between reads; the least recently read are closed
+MAX_OPEN_FILES = 64
+
+# Where read offsets are kept across restarts, and how often they are saved
+POSITIONS_PATH = "~/.cache/moltbot-watcher/positions.json"
+POSITIONS_SAVE_SECONDS = 30
+
+# Every user message entry contains this token (its role value)
+USER_ROLE_MARKER = b'"user"'
+
+# Alert levels that report suspicious messages
+SUSPICIOUS_ALERT_LEVELS = ("all", "new_sender", "suspicious")
+
+
+@dataclass(frozen=True)
+class CommandSettings:
+    """Settings for the Telegram commands, resolved once at load."""
+
+    # Declared by hand: dataclass(slots=True) needs Python 3.10
+    __slots__ = (
+        "status_enabled",
+        "kill_enabled",
+        "kill_service",
+        "restart_enabled",
+        "restart_service",
+        "logs_enabled",
+        "logs_lines",
+    )
+
+    status_enabled: bool
+    kill_enabled: bool
+    kill_service: str
+    restart_enabled: bool
+    restart_service: str
+    logs_enabled: bool
+    logs_lines: int
+
 
 class Config:
     """Load and manage configuration."""
@@ -36,7 +153,9 @@ class Config:
             )
 
         with open(config_path) as f:
-            self.data = yaml.safe_load(f)
+            # Use libyaml's C loader when PyYAML was built with it
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            self.data = yaml.load(f, Loader=loader)
 
         self.bot_token = self.data["telegram"]["bot_token"]
         self.chat_id = str(self.data["telegram"]["chat_id"])
@@ -44,110 +163,571 @@ class Config:
         self.alert_level = self.data.get("watch", {}).get(
             "alert_level", "new_sender"
         )
-        self.commands = self.data.get("commands", {})
+        commands = self.data.get("commands", {}) or {}
+        # A section left empty in YAML loads as None
+        status = commands.get("status") or {}
+        kill = commands.get("kill") or {}
+        restart = commands.get("restart") or {}
+        logs = commands.get("logs") or {}
+        self.commands = CommandSettings(
+            status_enabled=status.get("enabled", True),
+            kill_enabled=kill.get("enabled", True),
+            kill_service=kill.get("service_name", "moltbot"),
+            restart_enabled=restart.get("enabled", True),
+            restart_service=restart.get("service_name", "moltbot"),
+            logs_enabled=logs.get("enabled", True),
+            logs_lines=logs.get("lines", 20),
+        )
         self.alerts = self.data.get("alerts", {})
 
+        patterns = self.data.get("patterns", {})
+        self.suspicious_patterns = patterns.get("suspicious", []) or []
+        self.blocked_senders = {
+            sys.intern(str(sender))
+            for sender in patterns.get("blocked_senders", []) or []
+        }
+
+        for pattern in self.suspicious_patterns:
+            if NESTED_QUANTIFIER.search(pattern):
+                logger.warning(
+                    f"Suspicious pattern may backtrack catastrophically: {pattern}"
+                )
+
+        # The regex package supports a per-search timeout, which bounds the
+        # cost of a bad pattern meeting an attacker-controlled message
+        engine = regex if regex is not None else re
+        self.suspicious_regexes = [
+            engine.compile(pattern, engine.IGNORECASE)
+            for pattern in self.suspicious_patterns
+        ]
+
+        # All patterns in one alternation, so a clean message is ruled out
+        # with a single scan instead of one per pattern. Groups and inline
+        # flags don't survive being joined (group numbers and names shift or
+        # clash, global flags must come first), so such sets scan one by one
+        self.suspicious_union = None
+        if self.suspicious_patterns and not any(
+            compiled.groups for compiled in self.suspicious_regexes
+        ):
+            try:
+                union = engine.compile(
+                    "|".join(
+                        f"(?:{pattern})" for pattern in self.suspicious_patterns
+                    ),
+                    engine.IGNORECASE,
+                )
+            except engine.error:
+                union = None
+            if (
+                union is not None
+                and union.flags == engine.compile("", engine.IGNORECASE).flags
+            ):
+                self.suspicious_union = union
+
+        # Prefer a Hyperscan database when available: it matches every
+        # pattern in one DFA pass with no backtracking
+        self.suspicious_db = None
+        if hyperscan is not None and self.suspicious_patterns:
+            try:
+                db = hyperscan.Database()
+                db.compile(
+                    expressions=[
+                        p.encode() for p in self.suspicious_patterns
+                    ],
+                    ids=list(range(len(self.suspicious_patterns))),
+                    elements=len(self.suspicious_patterns),
+                    flags=[
+                        hyperscan.HS_FLAG_CASELESS
+                        | hyperscan.HS_FLAG_SINGLEMATCH
+                        | hyperscan.HS_FLAG_UTF8
+                    ]
+                    * len(self.suspicious_patterns),
+                )
+                self.suspicious_db = db
+            except Exception as e:
+                logger.warning(
+                    f"Hyperscan could not compile patterns, using re: {e}"
+                )
+
 
-class SessionWatcher(FileSystemEventHandler):
+class SessionWatcher(PatternMatchingEventHandler):
     """Watch for new session files and messages."""
 
-    def __init__(self, config: Config, bot_app: Application):
+    def __init__(
+        self,
+        config: Config,
+        bot_app: Application,
+        loop: asyncio.AbstractEventLoop,
+    ):
+        # Only events for files the configured globs match reach the handlers
+        super().__init__(
+            patterns=[os.path.expanduser(p) for p in config.watch_paths],
+            ignore_directories=True,
+            case_sensitive=True,
+        )
         self.config = config
         self.bot_app = bot_app
-        self.known_senders = set()
+        self.loop = loop
+        self.known_senders = collections.OrderedDict()
         self.watched_files = {}
+        self.file_inodes = {}
+        self.blocked_files = set()
+        self._open_files = collections.OrderedDict()
+
+        # The alert level never changes at runtime, so decide once whether
+        # new messages need to be parsed at all
+        self._alert_all = config.alert_level == "all"
+        self._read_messages = self._alert_all or (
+            config.alert_level in SUSPICIOUS_ALERT_LEVELS
+            and bool(config.suspicious_patterns)
+        )
+        self._parser = simdjson.Parser() if simdjson is not None else None
+        self._pending = set()
+        self._alert_queue: asyncio.Queue = asyncio.Queue()
+        self._positions_path = os.path.expanduser(POSITIONS_PATH)
+        self._positions_saved_at = time.monotonic()
         self._initialize_file_positions()
 
     def _initialize_file_positions(self):
-        """Set file positions to EOF for existing files to avoid replaying history."""
+        """Resume existing files from their saved position, or from EOF."""
+        import fnmatch
         import glob
+        saved = self._load_positions()
+
+        # Group file name patterns by directory so each directory is listed
+        # once, however many watch patterns point into it
+        name_patterns = collections.defaultdict(list)
         for path_pattern in self.config.watch_paths:
             expanded = os.path.expanduser(path_pattern)
-            for filepath in glob.glob(expanded):
-                if os.path.isfile(filepath):
-                    size = os.path.getsize(filepath)
-                    self.watched_files[filepath] = size
-                    logger.info(f"Initialized {filepath} at position {size}")
+            name_re = re.compile(fnmatch.translate(os.path.basename(expanded)))
+            for directory in glob.glob(os.path.dirname(expanded)):
+                name_patterns[directory].append(name_re)
+
+        for directory, regexes in name_patterns.items():
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if not any(r.match(entry.name) for r in regexes):
+                        continue
+                    if not entry.is_file():
+                        continue
+                    # Stat through symlinks, as _session_fd does, so the
+                    # inodes compare equal
+                    st = entry.stat()
+                    size = st.st_size
+                    inode = st.st_ino
+                    position, saved_inode = saved.get(entry.path, (size, inode))
+                    # A file replaced while we were down starts at EOF, like
+                    # one we have never seen
+                    if saved_inode not in (inode, None) or position > size:
+                        position = size
+                    self.watched_files[entry.path] = position
+                    self.file_inodes[entry.path] = inode
+                    logger.info(f"Initialized {entry.path} at position {position}")
+
+                    # Messages written while we were down; a finished
+                    # session gets no further modify event to read them
+                    if position < size:
+                        self.loop.call_soon_threadsafe(
+                            self._schedule_modified, entry.path
+                        )
+
+    def _load_positions(self) -> dict:
+        """Load read positions and inodes saved by a previous run."""
+        try:
+            with open(self._positions_path, "rb") as f:
+                saved = loads(f.read())
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Could not load saved positions: {e}")
+            return {}
+
+        # Files saved as a bare position have no inode to check
+        return {
+            path: tuple(value) if isinstance(value, list) else (value, None)
+            for path, value in saved.items()
+        }
+
+    def save_positions(self):
+        """Write the current read positions to disk."""
+        try:
+            os.makedirs(os.path.dirname(self._positions_path), exist_ok=True)
+            tmp_path = f"{self._positions_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        path: [position, self.file_inodes.get(path)]
+                        for path, position in self.watched_files.items()
+                    },
+                    f,
+                )
+            os.replace(tmp_path, self._positions_path)
+            self._positions_saved_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Failed to save positions: {e}")
 
     def on_created(self, event):
         """Handle new file creation."""
-        if event.is_directory:
-            return
-
-        if event.src_path.endswith(".jsonl"):
-            logger.info(f"New session file: {event.src_path}")
-            asyncio.run(self._process_new_file(event.src_path))
+        logger.info(f"New session file: {event.src_path}")
+        self.loop.call_soon_threadsafe(self._track_new_file, event.src_path)
 
     def on_modified(self, event):
         """Handle file modifications."""
-        if event.is_directory:
+        self.loop.call_soon_threadsafe(self._schedule_modified, event.src_path)
+
+    def on_deleted(self, event):
+        """Handle session file removal."""
+        self.loop.call_soon_threadsafe(self._forget_file, event.src_path)
+
+    def on_moved(self, event):
+        """Handle a session file renamed into place, e.g. an atomic rewrite."""
+        self.loop.call_soon_threadsafe(self._forget_file, event.src_path)
+        if match_any_paths(
+            [event.dest_path],
+            included_patterns=self.patterns,
+            case_sensitive=self.case_sensitive,
+        ):
+            logger.info(f"Replaced session file: {event.dest_path}")
+            self.loop.call_soon_threadsafe(
+                self._track_moved_file, event.dest_path
+            )
+
+    def _track_moved_file(self, filepath: str):
+        """Follow a file renamed into place, keeping the old read position."""
+        cached = self._open_files.pop(filepath, None)
+        if cached is not None:
+            os.close(cached[0])
+
+        last_pos = self.watched_files.get(filepath)
+        if last_pos is None:
+            self._track_new_file(filepath)
+        else:
+            # A rewrite usually keeps what was already read; the sender and
+            # its blocked state carry over too. As with new files, a large
+            # unread remainder is treated as a different transcript
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                return
+            if st.st_size - last_pos > NEW_FILE_REPLAY_BYTES:
+                last_pos = st.st_size
+            self.watched_files[filepath] = min(last_pos, st.st_size)
+            self.file_inodes[filepath] = st.st_ino
+
+        # A rename brings no modify event, so read what it moved in now
+        self._schedule_modified(filepath)
+
+    def _track_new_file(self, filepath: str):
+        """Start following a new file, replaying it unless it is large."""
+        # Already picked up by track_directory or an earlier event
+        if filepath in self.watched_files:
+            return
+        try:
+            st = os.stat(filepath)
+        except OSError:
             return
+        self.watched_files[filepath] = (
+            st.st_size if st.st_size > NEW_FILE_REPLAY_BYTES else 0
+        )
+        self.file_inodes[filepath] = st.st_ino
+        self.loop.create_task(self._process_new_file(filepath))
 
-        if event.src_path.endswith(".jsonl"):
-            asyncio.run(self._process_modified_file(event.src_path))
+    def track_directory(self, directory: str):
+        """Follow session files created before their directory was watched."""
+        try:
+            with os.scandir(directory) as entries:
+                paths = [entry.path for entry in entries if entry.is_file()]
+        except OSError:
+            return
+        for path in paths:
+            if match_any_paths(
+                [path],
+                included_patterns=self.patterns,
+                case_sensitive=self.case_sensitive,
+            ):
+                logger.info(f"New session file: {path}")
+                self._track_new_file(path)
+
+    def _schedule_modified(self, filepath: str):
+        """Coalesce a burst of modify events into a single read of the file."""
+        # A read is already scheduled and will pick up this write too; not
+        # re-arming it means a steady stream of writes can't starve it
+        if filepath in self._pending:
+            return
+        self._pending.add(filepath)
+        self.loop.call_later(DEBOUNCE_SECONDS, self._run_modified, filepath)
+
+    def _run_modified(self, filepath: str):
+        """Process a modified file once its debounce window has passed."""
+        self._pending.discard(filepath)
+        self.loop.create_task(self._process_modified_file(filepath))
 
     async def _process_new_file(self, filepath: str):
         """Process a newly created session file."""
         try:
-            with open(filepath) as f:
-                lines = f.readlines()
-                if lines:
-                    # Check first line for sender info
-                    import json
-
-                    first_msg = json.loads(lines[0])
-                    sender = first_msg.get("sender", {})
-                    sender_id = sender.get("id", "unknown")
-
-                    if sender_id not in self.known_senders:
-                        self.known_senders.add(sender_id)
-                        await self._send_alert(
-                            f"🆕 New sender: {sender.get('name', sender_id)}\n"
-                            f"File: {Path(filepath).name}"
-                        )
+            # Only the first line carries sender info; don't read the rest
+            with open(filepath, "rb") as f:
+                first_line = f.readline()
+            if not first_line:
+                return
+
+            first_msg = loads(first_line)
+            sender = first_msg.get("sender", {})
+            sender_id = sys.intern(str(sender.get("id", "unknown")))
+
+            # A complete header line with no message in it needs no second
+            # parse by the modify handler
+            if (
+                first_line.endswith(b"\n")
+                and "message" not in first_msg
+                and self.watched_files.get(filepath, 0) < len(first_line)
+            ):
+                self.watched_files[filepath] = len(first_line)
+
+            if sender_id in self.config.blocked_senders:
+                self.blocked_files.add(filepath)
+                return
+
+            if self._remember_sender(sender_id):
+                await self._send_alert(
+                    f"🆕 New sender: {sender.get('name', sender_id)}\n"
+                    f"File: {Path(filepath).name}"
+                )
         except Exception as e:
             logger.error(f"Error processing new file: {e}")
 
+    def check_suspicious_batch(self, texts: list) -> list:
+        """Return the matching patterns for each of several texts."""
+        if self.config.suspicious_db is not None:
+            results = []
+            for text in texts:
+                ids = set()
+
+                def on_match(pattern_id, start, end, flags, context):
+                    ids.add(pattern_id)
+
+                self.config.suspicious_db.scan(
+                    text.encode("utf-8", "replace"), match_event_handler=on_match
+                )
+                results.append(
+                    [self.config.suspicious_patterns[i] for i in sorted(ids)]
+                )
+            return results
+
+        if not self.config.suspicious_regexes:
+            return [[] for _ in texts]
+
+        # Each text is scanned on its own so anchors, character classes and
+        # the scan timeout all apply to one message at a time
+        union = self.config.suspicious_union
+        results = []
+        for text in texts:
+            try:
+                # Alternation reports at most one pattern per position, so on a
+                # hit every pattern is checked to list all that match
+                if union is not None and not self._pattern_search(union, text):
+                    results.append([])
+                    continue
+                results.append(
+                    [
+                        pattern
+                        for pattern, compiled in zip(
+                            self.config.suspicious_patterns,
+                            self.config.suspicious_regexes,
+                        )
+                        if self._pattern_search(compiled, text)
+                    ]
+                )
+            except TimeoutError:
+                logger.warning("Suspicious pattern scan timed out")
+                results.append(["pattern scan timed out"])
+        return results
+
+    def _pattern_search(self, compiled, text: str):
+        """Search the text, within the scan time budget if regex is installed."""
+        if regex is not None:
+            return compiled.search(text, timeout=PATTERN_TIMEOUT_SECONDS)
+        return compiled.search(text)
+
+    def _remember_sender(self, sender_id) -> bool:
+        """Record a sender as recently seen, returning True if it was new."""
+        is_new = sender_id not in self.known_senders
+        self.known_senders[sender_id] = None
+        self.known_senders.move_to_end(sender_id)
+        if len(self.known_senders) > MAX_KNOWN_SENDERS:
+            self.known_senders.popitem(last=False)
+        return is_new
+
+    def _session_fd(self, filepath: str) -> tuple:
+        """Return a cached fd for the file, its size and its inode."""
+        st = os.stat(filepath)
+        cached = self._open_files.get(filepath)
+        if cached is not None and cached[1] == st.st_ino:
+            self._open_files.move_to_end(filepath)
+            return cached[0], st.st_size, st.st_ino
+
+        if cached is not None:
+            os.close(cached[0])
+        fd = os.open(filepath, os.O_RDONLY)
+        st = os.fstat(fd)
+        self._open_files[filepath] = (fd, st.st_ino)
+        if len(self._open_files) > MAX_OPEN_FILES:
+            _, (old_fd, _) = self._open_files.popitem(last=False)
+            os.close(old_fd)
+        return fd, st.st_size, st.st_ino
+
+    def _forget_file(self, filepath: str):
+        """Drop the position and cached descriptor of a deleted file."""
+        self.watched_files.pop(filepath, None)
+        self.file_inodes.pop(filepath, None)
+        self.blocked_files.discard(filepath)
+        cached = self._open_files.pop(filepath, None)
+        if cached is not None:
+            os.close(cached[0])
+
     async def _process_modified_file(self, filepath: str):
         """Process changes to an existing session file."""
+        # Cheapest checks first: blocked senders and alert levels that never
+        # look at message text don't need the new lines parsed at all
+        if (
+            filepath in self.blocked_files
+            or not self._read_messages
+        ):
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                return
+            self.watched_files[filepath] = st.st_size
+            self.file_inodes[filepath] = st.st_ino
+            return
+
         last_pos = self.watched_files.get(filepath, 0)
+        texts = []
+        alerts = []
 
         try:
-            with open(filepath) as f:
-                f.seek(last_pos)
-                new_content = f.read()
-                self.watched_files[filepath] = f.tell()
-
-                if new_content.strip() and self.config.alert_level == "all":
-                    import json
-
-                    for line in new_content.strip().splitlines():
-                        if line:
-                            try:
-                                msg = json.loads(line)
-                                msg_data = msg.get("message", {})
-                                role = msg_data.get("role", "unknown")
-                                content_arr = msg_data.get("content", [])
-
-                                # Extract text from content array
-                                text = ""
-                                if isinstance(content_arr, list):
-                                    for item in content_arr:
-                                        if isinstance(item, dict) and item.get("type") == "text":
-                                            text = item.get("text", "")[:300]
-                                            break
-                                elif isinstance(content_arr, str):
-                                    text = content_arr[:300]
-
-                                # Only alert on user messages
-                                if role == "user" and text:
-                                    await self._send_alert(f"💬 {text}")
-                            except json.JSONDecodeError:
-                                pass
+            # Read everything appended since the last event in one call
+            fd, size, inode = self._session_fd(filepath)
+            if self.file_inodes.get(filepath, inode) != inode or size < last_pos:
+                # File was truncated or replaced, start over
+                last_pos = 0
+            self.file_inodes[filepath] = inode
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, last_pos, 0, os.POSIX_FADV_SEQUENTIAL)
+            new_content = os.pread(fd, size - last_pos, last_pos)
+            # We never read these bytes again; let the kernel drop them
+            # from the page cache instead of evicting hotter data
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(
+                    fd, 0, last_pos + len(new_content), os.POSIX_FADV_DONTNEED
+                )
+
+            # Only consume complete lines; a partially written entry is
+            # picked up on the next modification
+            last_nl = new_content.rfind(b"\n")
+            if last_nl == -1:
+                return
+            self.watched_files[filepath] = last_pos + last_nl + 1
+            if time.monotonic() - self._positions_saved_at > POSITIONS_SAVE_SECONDS:
+                self.save_positions()
+
+            for line in new_content[:last_nl].split(b"\n"):
+                # Most lines are assistant and tool output; a substring check
+                # is far cheaper than parsing them only to read the role
+                if USER_ROLE_MARKER not in line:
+                    continue
+                try:
+                    text = self._extract_user_text(line)
+                except ValueError:
+                    # Invalid JSON; both parsers raise ValueError subclasses
+                    continue
+                if text:
+                    texts.append(text)
+
+            # Check each collected message for suspicious patterns
+            for text, flags in zip(texts, self.check_suspicious_batch(texts)):
+                if flags or self._alert_all:
+                    alerts.append(self._format_alert(text, flags))
         except Exception as e:
             logger.error(f"Error processing modified file: {e}")
 
+        await self._send_alerts(alerts)
+
+    def _extract_user_text(self, line: bytes) -> str:
+        """Return the text of a user message entry, or "" for anything else.
+
+        With simdjson only the fields read here are materialized. Its proxies
+        must not outlive this call, as the parser is reused for every line.
+        """
+        if self._parser is not None:
+            msg = self._parser.parse(line)
+        else:
+            msg = loads(line)
+        # Valid JSON isn't necessarily an entry; skip anything that is not
+        # an object (dicts and simdjson objects both have .get)
+        if not hasattr(msg, "get"):
+            return ""
+        msg_data = msg.get("message", {})
+        if not hasattr(msg_data, "get"):
+            return ""
+
+        # Only alert on user messages
+        if msg_data.get("role", "unknown") != "user":
+            return ""
+
+        # Extract text from content array
+        content_arr = msg_data.get("content", [])
+        if isinstance(content_arr, str):
+            return content_arr
+        if not hasattr(content_arr, "__iter__"):
+            return ""
+        for item in content_arr:
+            if hasattr(item, "get") and item.get("type") == "text":
+                text = item.get("text", "")
+                return text if isinstance(text, str) else ""
+        return ""
+
+    def _format_alert(self, text: str, flags: list) -> str:
+        """Build the alert for a user message and its matched patterns."""
+        if not flags:
+            return f"💬 {text[:300]}"
+
+        parts = ["⚠️ Suspicious input", text[:300], "", "Flags:"]
+        parts.extend(f"  - {flag}" for flag in flags)
+        return "\n".join(parts)
+
+    async def drain_alerts(self):
+        """Deliver queued alerts, combining those that arrive close together."""
+        while True:
+            alerts = [await self._alert_queue.get()]
+            await asyncio.sleep(ALERT_BATCH_SECONDS)
+            while not self._alert_queue.empty():
+                alerts.append(self._alert_queue.get_nowait())
+
+            # Use as few Telegram messages as the length limit allows
+            chunk = ""
+            for alert in alerts:
+                if chunk and len(chunk) + len(alert) + 2 > MAX_ALERT_LENGTH:
+                    await self._deliver_alert(chunk)
+                    chunk = ""
+                chunk = f"{chunk}\n\n{alert}" if chunk else alert
+
+            await self._deliver_alert(chunk)
+
+    async def _send_alerts(self, alerts: list):
+        """Queue several alerts for delivery."""
+        for alert in alerts:
+            self._alert_queue.put_nowait(alert)
+
     async def _send_alert(self, message: str):
+        """Queue an alert for delivery to the admin."""
+        self._alert_queue.put_nowait(message)
+
+    async def _deliver_alert(self, message: str):
         """Send alert to admin via Telegram."""
         try:
             await self.bot_app.bot.send_message(
@@ -157,31 +737,84 @@ class SessionWatcher(FileSystemEventHandler):
             logger.error(f"Failed to send alert: {e}")
 
 
+class SessionDirWatcher(FileSystemEventHandler):
+    """Watch for session directories being added or removed."""
+
+    def __init__(self, refresh, forget):
+        super().__init__()
+        self.refresh = refresh
+        self.forget = forget
+
+    def on_created(self, event):
+        """Handle a new directory that may be or lead to a session directory."""
+        self.refresh()
+
+    def on_moved(self, event):
+        """Handle a renamed directory."""
+        self.forget(event.src_path)
+        self.refresh()
+
+    def on_deleted(self, event):
+        """Handle a removed directory."""
+        self.forget(event.src_path)
+
+
 class WatcherBot:
     """Telegram bot for receiving commands and sending alerts."""
 
     def __init__(self, config: Config):
         self.config = config
-        self.app = Application.builder().token(config.bot_token).build()
+        # Pool several connections so concurrent alerts and command replies
+        # don't queue behind each other on one socket, and multiplex them
+        # over a single HTTP/2 connection when h2 is installed
+        self.app = (
+            Application.builder()
+            .token(config.bot_token)
+            .http_version("2" if h2 is not None else "1.1")
+            .connection_pool_size(8)
+            .pool_timeout(5)
+            .connect_timeout(5)
+            .read_timeout(10)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         self.watcher: Optional[SessionWatcher] = None
         self.observer: Optional[Observer] = None
-
-        # Register command handlers
-        self.app.add_handler(CommandHandler("start", self.cmd_start))
-        self.app.add_handler(CommandHandler("status", self.cmd_status))
-        self.app.add_handler(CommandHandler("kill", self.cmd_kill))
-        self.app.add_handler(CommandHandler("restart", self.cmd_restart))
-        self.app.add_handler(CommandHandler("logs", self.cmd_logs))
-        self.app.add_handler(CommandHandler("help", self.cmd_help))
+        self.dir_watcher: Optional[SessionDirWatcher] = None
+        self._session_watches = {}
+        self._parent_watches = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.alert_task: Optional[asyncio.Task] = None
+        self._status_cache: Optional[tuple[float, str]] = None
+        self._unit = None
+
+        # Register command handlers; updates from any other chat are
+        # dropped by the filter before a handler runs
+        chat_filter = filters.Chat(chat_id=int(config.chat_id))
+        self.app.add_handler(
+            CommandHandler("start", self.cmd_start, filters=chat_filter)
+        )
+        self.app.add_handler(
+            CommandHandler("status", self.cmd_status, filters=chat_filter)
+        )
+        self.app.add_handler(
+            CommandHandler("kill", self.cmd_kill, filters=chat_filter)
+        )
+        self.app.add_handler(
+            CommandHandler("restart", self.cmd_restart, filters=chat_filter)
+        )
+        self.app.add_handler(
+            CommandHandler("logs", self.cmd_logs, filters=chat_filter)
+        )
+        self.app.add_handler(
+            CommandHandler("help", self.cmd_help, filters=chat_filter)
+        )
 
     async def cmd_start(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Handle /start command."""
-        if str(update.effective_chat.id) != self.config.chat_id:
-            await update.message.reply_text("Unauthorized.")
-            return
-
         await update.message.reply_text(
             "🤖 Moltbot Watcher active!\n\n"
             "Commands:\n"
@@ -202,20 +835,12 @@ class WatcherBot:
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Handle /status command."""
-        if str(update.effective_chat.id) != self.config.chat_id:
-            return
-
-        if not self.config.commands.get("status", {}).get("enabled", True):
+        if not self.config.commands.status_enabled:
             await update.message.reply_text("Status command disabled.")
             return
 
         try:
-            result = subprocess.run(
-                ["systemctl", "is-active", "moltbot"],
-                capture_output=True,
-                text=True,
-            )
-            status = result.stdout.strip()
+            status = self._service_status()
 
             if status == "active":
                 emoji = "✅"
@@ -228,23 +853,45 @@ class WatcherBot:
         except Exception as e:
             await update.message.reply_text(f"Error checking status: {e}")
 
+    def _service_status(self) -> str:
+        """Return the moltbot unit state, reusing very recent results."""
+        now = time.monotonic()
+        if (
+            self._status_cache is not None
+            and now - self._status_cache[0] < STATUS_CACHE_SECONDS
+        ):
+            return self._status_cache[1]
+
+        if Unit is not None:
+            # Ask systemd over D-Bus instead of forking systemctl
+            if self._unit is None:
+                self._unit = Unit(b"moltbot.service")
+                self._unit.load()
+            status = self._unit.Unit.ActiveState.decode()
+        else:
+            result = subprocess.run(
+                ["systemctl", "is-active", "moltbot"],
+                capture_output=True,
+                text=True,
+            )
+            status = result.stdout.strip()
+
+        self._status_cache = (now, status)
+        return status
+
     async def cmd_kill(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Handle /kill command."""
-        if str(update.effective_chat.id) != self.config.chat_id:
-            return
-
-        if not self.config.commands.get("kill", {}).get("enabled", True):
+        if not self.config.commands.kill_enabled:
             await update.message.reply_text("Kill command disabled.")
             return
 
-        service = self.config.commands.get("kill", {}).get(
-            "service_name", "moltbot"
-        )
+        service = self.config.commands.kill_service
 
         try:
             subprocess.run(["sudo", "systemctl", "stop", service], check=True)
+            self._status_cache = None
             await update.message.reply_text(f"⏹️ Stopped {service}")
         except subprocess.CalledProcessError as e:
             await update.message.reply_text(f"Failed to stop: {e}")
@@ -253,21 +900,17 @@ class WatcherBot:
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Handle /restart command."""
-        if str(update.effective_chat.id) != self.config.chat_id:
-            return
-
-        if not self.config.commands.get("restart", {}).get("enabled", True):
+        if not self.config.commands.restart_enabled:
             await update.message.reply_text("Restart command disabled.")
             return
 
-        service = self.config.commands.get("restart", {}).get(
-            "service_name", "moltbot"
-        )
+        service = self.config.commands.restart_service
 
         try:
             subprocess.run(
                 ["sudo", "systemctl", "restart", service], check=True
             )
+            self._status_cache = None
             await update.message.reply_text(f"🔄 Restarted {service}")
         except subprocess.CalledProcessError as e:
             await update.message.reply_text(f"Failed to restart: {e}")
@@ -276,65 +919,209 @@ class WatcherBot:
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ):
         """Handle /logs command."""
-        if str(update.effective_chat.id) != self.config.chat_id:
-            return
-
-        if not self.config.commands.get("logs", {}).get("enabled", True):
+        if not self.config.commands.logs_enabled:
             await update.message.reply_text("Logs command disabled.")
             return
 
-        lines = self.config.commands.get("logs", {}).get("lines", 20)
+        lines = self.config.commands.logs_lines
 
         try:
+            logs = self._recent_logs(lines)[-4000:]  # Telegram message limit
+            await update.message.reply_text(f"📜 Recent logs:\n```\n{logs}\n```")
+        except Exception as e:
+            await update.message.reply_text(f"Failed to get logs: {e}")
+
+    def _recent_logs(self, lines: int) -> str:
+        """Return the last lines of the moltbot unit's journal."""
+        if journal is None:
+            # Message text only, the same as the journal.Reader path below
             result = subprocess.run(
-                ["journalctl", "-u", "moltbot", "-n", str(lines), "--no-pager"],
+                [
+                    "journalctl",
+                    "-u",
+                    "moltbot",
+                    "-n",
+                    str(lines),
+                    "-o",
+                    "cat",
+                    "--no-pager",
+                ],
                 capture_output=True,
                 text=True,
             )
-            logs = result.stdout[-4000:]  # Telegram message limit
-            await update.message.reply_text(f"📜 Recent logs:\n```\n{logs}\n```")
-        except Exception as e:
-            await update.message.reply_text(f"Failed to get logs: {e}")
+            return result.stdout
+
+        # Read the journal in-process, walking back from the newest entry
+        reader = journal.Reader()
+        try:
+            # The same entries as journalctl -u: the unit's own output, and
+            # systemd's messages about it (started, stopped, failed)
+            reader.add_match(_SYSTEMD_UNIT="moltbot.service")
+            reader.add_disjunction()
+            reader.add_match(UNIT="moltbot.service")
+            reader.seek_tail()
+            messages = []
+            for _ in range(lines):
+                entry = reader.get_previous()
+                if not entry:
+                    break
+                message = entry.get("MESSAGE", "")
+                if isinstance(message, bytes):
+                    # Messages that aren't valid UTF-8 are left as bytes
+                    message = message.decode("utf-8", "replace")
+                messages.append(str(message))
+        finally:
+            reader.close()
+        return "\n".join(reversed(messages))
 
     def start_file_watcher(self):
         """Start watching session files."""
-        self.watcher = SessionWatcher(self.config, self.app)
+        self.watcher = SessionWatcher(self.config, self.app, self.loop)
+        self.dir_watcher = SessionDirWatcher(
+            self._refresh_watches, self._forget_watches
+        )
         self.observer = Observer()
 
+        self._refresh_watches(initial=True)
+        if not self._session_watches:
+            logger.warning(
+                "No session directories exist yet; waiting for them to appear"
+            )
+
+        self.observer.start()
+
+    def _watch_targets(self) -> tuple:
+        """Return the existing session directories, and the directories in
+        which new session directories (or their ancestors) can appear."""
+        import glob
+        session_dirs = set()
+        parent_dirs = set()
         for path_pattern in self.config.watch_paths:
-            # Expand path and get directory
-            expanded = os.path.expanduser(path_pattern)
-            # Watch parent directory (glob patterns won't work directly)
-            watch_dir = str(Path(expanded).parent.parent.parent)
+            dir_pattern = os.path.dirname(os.path.expanduser(path_pattern))
+            session_dirs.update(
+                d for d in glob.glob(dir_pattern) if os.path.isdir(d)
+            )
 
-            if os.path.exists(watch_dir):
-                self.observer.schedule(
-                    self.watcher, watch_dir, recursive=True
+            # The deepest existing directory of the fixed part of the pattern
+            # (at most the session directory's parent), then every directory
+            # matching each globbed level below it
+            parts = Path(dir_pattern).parts
+            fixed = next(
+                (i for i, part in enumerate(parts) if glob.has_magic(part)),
+                len(parts) - 1,
+            )
+            anchor = os.path.join(*parts[:fixed])
+            while not os.path.isdir(anchor) and anchor != os.path.dirname(anchor):
+                anchor = os.path.dirname(anchor)
+            parent_dirs.add(anchor)
+            for level in range(fixed + 1, len(parts)):
+                parent_dirs.update(
+                    d
+                    for d in glob.glob(os.path.join(*parts[:level]))
+                    if os.path.isdir(d)
+                )
+        return session_dirs, parent_dirs
+
+    def _refresh_watches(self, initial: bool = False):
+        """Watch every session directory that exists, and where more can appear."""
+        session_dirs, parent_dirs = self._watch_targets()
+
+        # Watch only the session directories themselves, not whole subtrees,
+        # and only subscribe to the events SessionWatcher handles so opens,
+        # closes and reads never wake the observer thread
+        for watch_dir in sorted(session_dirs - self._session_watches.keys()):
+            self._session_watches[watch_dir] = self.observer.schedule(
+                self.watcher,
+                watch_dir,
+                recursive=False,
+                event_filter=[
+                    FileCreatedEvent,
+                    FileModifiedEvent,
+                    FileMovedEvent,
+                    FileDeletedEvent,
+                ],
+            )
+            logger.info(f"Watching: {watch_dir}")
+            if not initial:
+                # Files can land before the watch is in place
+                self.loop.call_soon_threadsafe(
+                    self.watcher.track_directory, watch_dir
                 )
-                logger.info(f"Watching: {watch_dir}")
-            else:
-                logger.warning(f"Watch path does not exist: {watch_dir}")
-
-        self.observer.start()
 
-    def run(self):
-        """Run the bot."""
-        logger.info("Starting Moltbot Watcher...")
+        # Parent directories only need to report new and removed directories
+        for parent_dir in sorted(parent_dirs - self._parent_watches.keys()):
+            self._parent_watches[parent_dir] = self.observer.schedule(
+                self.dir_watcher,
+                parent_dir,
+                recursive=False,
+                event_filter=[DirCreatedEvent, DirMovedEvent, DirDeletedEvent],
+            )
+            logger.debug(f"Watching for session directories in: {parent_dir}")
+
+        # A directory created inside a new one before it was watched
+        # produced no event, so look again until nothing new turns up
+        session_dirs, parent_dirs = self._watch_targets()
+        if (
+            session_dirs - self._session_watches.keys()
+            or parent_dirs - self._parent_watches.keys()
+        ):
+            self._refresh_watches(initial)
+
+    def _forget_watches(self, removed: str):
+        """Drop watches on a removed directory and everything below it."""
+        for watches in (self._session_watches, self._parent_watches):
+            for watch_dir in list(watches):
+                if watch_dir == removed or watch_dir.startswith(removed + os.sep):
+                    try:
+                        self.observer.unschedule(watches.pop(watch_dir))
+                    except KeyError:
+                        pass
+
+    async def _post_init(self, app: Application):
+        """Start watching files and announce startup once the loop runs."""
+        # File events are handled on this loop, so the bot's HTTP client
+        # and its connections are shared by every alert
+        self.loop = asyncio.get_running_loop()
 
         # Start file watcher
         self.start_file_watcher()
+        self.alert_task = self.loop.create_task(self.watcher.drain_alerts())
 
         # Send startup message
-        async def send_startup():
-            await self.app.bot.send_message(
-                chat_id=self.config.chat_id,
-                text=f"🟢 Moltbot Watcher started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            )
+        await app.bot.send_message(
+            chat_id=self.config.chat_id,
+            text=f"🟢 Moltbot Watcher started at {time.strftime(TIME_FORMAT)}",
+        )
 
-        asyncio.get_event_loop().run_until_complete(send_startup())
+    async def _post_shutdown(self, app: Application):
+        """Stop watching files and delivering alerts before the loop closes."""
+        # The observer hands events to this loop, so it must stop first
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+        if self.alert_task is not None:
+            self.alert_task.cancel()
+            try:
+                await self.alert_task
+            except asyncio.CancelledError:
+                pass
+
+    def run(self):
+        """Run the bot."""
+        logger.info("Starting Moltbot Watcher...")
 
         # Run bot
-        self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        try:
+            self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        finally:
+            # Normally already stopped by _post_shutdown
+            if self.observer is not None:
+                self.observer.stop()
+                self.observer.join()
+            if self.watcher is not None:
+                self.watcher.save_positions()
 
 
 def main():